@@ -0,0 +1,153 @@
+# auth.py
+# Authentication shared by all routers: JWT creation and verification, the get_current_user
+# dependency, and password hashing.
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+import bcrypt
+import jwt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jwt import PyJWTError
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from models import User
+
+# Should be stored in .env or securely in production
+SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
+ALGORITHM = "HS256"
+
+# Verified tokens kept in memory, and for how long (never past the token's own expiry)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "300"))
+
+# Threads dedicated to bcrypt, and how many hash/check calls may wait for them before we shed load
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+
+# OAuth2PasswordBearer is used to extract the token from the Authorization header
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
+
+# The authenticated user behind a token
+class Principal(NamedTuple):
+    user_id: int
+    email: str
+    name: str
+
+# Bounded LRU of verified tokens -> (Principal, expires_at)
+class TokenCache:
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: float):
+        expires_at = min(token_expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    # Forget every token of a user (deleted or changed). By id, since an update may have
+    # changed the email the tokens were cached under.
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in [token for token, (principal, _) in self._entries.items() if principal.user_id == user_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# Cached principals must not outlive the user row they describe
+@event.listens_for(User, "after_delete")
+@event.listens_for(User, "after_update")
+def _invalidate_user_tokens(mapper, connection, user):
+    token_cache.invalidate_user(user.id)
+
+def create_access_token(email: str, name: str):
+    """Generate a JWT token for the user."""
+    expiration = datetime.utcnow() + timedelta(weeks=1)  # Token expires in 1 week
+    token_data = {"sub": email, "name": name, "exp": expiration}
+    return jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+
+# Helper function to decode and verify the JWT token, returns its payload
+def verify_token(token: str):
+    try:
+        # jwt.decode also rejects tokens past their "exp"
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+    except PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+
+# Dependency: the authenticated user, from the token cache or by verifying the token and looking the user up
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = verify_token(token)
+
+    # Check if the user exists
+    user = await db.scalar(select(User).where(User.email == payload["sub"]))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    principal = Principal(user_id=user.id, email=user.email, name=user.name)
+    token_cache.put(token, principal, payload["exp"])
+    return principal
+
+# bcrypt gets its own small pool so a burst of logins cannot starve the shared threadpool
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_pending = 0  # Only touched from the event loop
+
+async def _run_bcrypt(fn, *args):
+    global _password_executor, _password_pending
+    if _password_pending >= BCRYPT_MAX_PENDING:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many login attempts, try again shortly")
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_pending -= 1
+
+# Hash a password for storage
+async def hash_password(password: str) -> str:
+    hashed = await _run_bcrypt(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+    return hashed.decode('utf-8')
+
+# Check a password against its stored hash
+async def check_password(password: str, hashed_password: str) -> bool:
+    return await _run_bcrypt(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+# Stop the bcrypt threads (called on application shutdown)
+def shutdown_password_executor():
+    global _password_executor
+    executor, _password_executor = _password_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,291 @@
+from sqlalchemy import select, tuple_, func, and_, literal, union_all, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from models import User, Post, Comment, SEARCH_CONFIG
+from schemas import UserCreate, PostCreate, PostResponse, CommentCreate, CommentResponse
+from auth import hash_password
+import base64
+import binascii
+import html
+from datetime import datetime
+from uuid import UUID, uuid4
+import io
+
+# All functions take the session handed out by database.get_db: an AsyncSession, or the
+# SyncSessionAdapter when DB_ASYNC is off. Sessions don't expire objects on commit, so
+# there is no refresh after writes.
+
+# Get User by email
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+# Create User
+async def create_user(db: AsyncSession, user: UserCreate):
+    db_user = await get_user_by_email(db, user.email)
+    if db_user:
+        raise Exception("User already exists")
+    
+    # Hash the password before storing it (on the dedicated bcrypt threads)
+    hashed_password = await hash_password(user.password)
+    
+    db_user = User(name=user.name, email=user.email, password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    return db_user
+
+# Get all Users
+async def get_all_users(db: AsyncSession):
+    return (await db.scalars(select(User))).all()
+
+# Create Post (image_digest is the upload, already saved in the image store)
+async def create_post(db: AsyncSession, caption: str, image_digest: str, user_email: str):
+    post_id = str(uuid4())  # Generate a unique post ID
+    new_post = Post(post_id=post_id, user_email=user_email, image_digest=image_digest, caption=caption)
+    db.add(new_post)
+    await db.commit()
+    return new_post
+
+# Get all Posts
+async def get_all_posts(db: AsyncSession):
+    return (await db.scalars(select(Post))).all()
+
+# Encode the feed position of a post as an opaque cursor string
+def encode_cursor(post: Post) -> str:
+    raw = f"{post.created_at.isoformat()}|{post.post_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8')
+
+# Decode a cursor produced by encode_cursor back into (created_at, post_id)
+def decode_cursor(cursor: str):
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8').split("|")
+        return datetime.fromisoformat(created_at), UUID(post_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+# Feed query: newest first, starting strictly after the (created_at, post_id) position if given.
+# The row comparison matches ix_posts_created_at_post_id, so each page is an index range scan.
+def feed_query(after=None):
+    query = select(Post).order_by(Post.created_at.desc(), Post.post_id.desc())
+    if after is not None:
+        query = query.where(tuple_(Post.created_at, Post.post_id) < tuple_(*after))
+    return query
+
+# Get one page of Posts, returns (posts, next_cursor)
+async def get_posts_page(db: AsyncSession, limit: int, after=None):
+    # Fetch one extra row to know whether another page exists
+    posts = (await db.scalars(feed_query(after).limit(limit + 1))).all()
+    if len(posts) > limit:
+        posts = posts[:limit]
+        return posts, encode_cursor(posts[-1])
+    return posts, None
+
+# Get Post by ID
+async def get_post_by_id(db: AsyncSession, post_id: str):
+    return await db.scalar(select(Post).where(Post.post_id == post_id))
+
+# Edit Post (image_digest is the new upload, already saved in the image store)
+async def edit_post(db: AsyncSession, post_id: str, caption: str, image_digest, user_email: str):
+    post = await get_post_by_id(db, post_id)
+    if not post:
+        raise Exception("Post not found")
+
+    # Ensure the authenticated user is the owner of the post
+    if post.user_email != user_email:
+        raise Exception("You are not allowed to edit this post")
+
+    # Update the post's details if provided
+    if caption:
+        post.caption = caption
+    if image_digest:
+        post.image_digest = image_digest
+
+    await db.commit()
+    return post
+
+# Delete Post
+async def delete_post(db: AsyncSession, post_id: str, user_email: str):
+    post = await get_post_by_id(db, post_id)
+    if not post:
+        raise Exception("Post not found")
+
+    # Ensure the authenticated user is the owner of the post
+    if post.user_email != user_email:
+        raise Exception("You are not allowed to delete this post")
+
+    # Delete the post
+    await db.delete(post)
+    await db.commit()
+    return post
+
+# Create Comment
+async def create_comment(db: AsyncSession, comment: CommentCreate, user_email: str):
+    # Check if the post exists
+    post = await get_post_by_id(db, comment.post_id)
+    if not post:
+        raise Exception("Post not found")
+
+    # Create a new Comment instance
+    new_comment = Comment(
+        comment_id=str(uuid4()),
+        user_email=user_email,
+        post_id=comment.post_id,
+        text=comment.text,
+        created_at=datetime.utcnow()
+    )
+
+    db.add(new_comment)
+    await db.commit()
+    return new_comment
+
+# Get Comment by ID
+async def get_comment_by_id(db: AsyncSession, comment_id: str):
+    return await db.scalar(select(Comment).where(Comment.comment_id == comment_id))
+
+# Get Comments for a Post, oldest first (optionally one page of them)
+async def get_comments_for_post(db: AsyncSession, post_id: str, limit: int = None, offset: int = 0):
+    query = select(Comment).where(Comment.post_id == post_id).order_by(Comment.created_at, Comment.comment_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.scalars(query.offset(offset))).all()
+
+# Get one page of Comments (newest first) for each of many Posts.
+# Returns {post_id: (comment_count, [comments])}; posts without comments are left out.
+async def get_comments_for_posts(db: AsyncSession, post_ids, limit: int, offset: int = 0):
+    if not post_ids:
+        return {}
+
+    # Comment counts per post (an index-only scan of ix_comments_post_id_created_at)
+    counts = dict((await db.execute(
+        select(Comment.post_id, func.count())
+        .where(Comment.post_id.in_(post_ids))
+        .group_by(Comment.post_id)
+    )).all())
+    if not counts:
+        return {}
+
+    # Per post, read only the requested page off ix_comments_post_id_created_at (LATERAL ... LIMIT)
+    # rather than numbering every comment of the post
+    page = (
+        select(Comment)
+        .where(Comment.post_id == Post.post_id)
+        .order_by(Comment.created_at.desc(), Comment.comment_id.desc())
+        .offset(offset)
+        .limit(limit)
+        .lateral("page")
+    )
+    page_comment = aliased(Comment, page)
+    comments = (await db.scalars(
+        select(page_comment)
+        .select_from(Post)
+        .join(page, true())
+        .where(Post.post_id.in_(list(counts)))
+        .order_by(page.c.post_id, page.c.created_at.desc(), page.c.comment_id.desc())
+    )).all()
+
+    grouped = {post_id: (comment_count, []) for post_id, comment_count in counts.items()}
+    for comment in comments:
+        grouped[comment.post_id][1].append(comment)
+    return grouped
+
+# ts_headline options for search snippets: up to two fragments, matches wrapped in control
+# characters rather than tags, so the text can be HTML-escaped before they become <b></b>
+SEARCH_MATCH_START = "\x02"
+SEARCH_MATCH_STOP = "\x03"
+SEARCH_SNIPPET_OPTIONS = f"StartSel={SEARCH_MATCH_START}, StopSel={SEARCH_MATCH_STOP}, MaxWords=30, MinWords=10, MaxFragments=2"
+
+# Snippet as safe HTML: the text escaped, the matches in <b></b>
+def snippet_html(snippet: str) -> str:
+    return html.escape(snippet).replace(SEARCH_MATCH_START, "<b>").replace(SEARCH_MATCH_STOP, "</b>")
+
+# Full-text search over post captions and comment texts, best match first.
+# kind is "all", "posts" or "comments"; author limits hits to one user_email.
+# Returns one page of rows (kind, post_id, comment_id, user_email, created_at, rank, snippet)
+# and the offset of the next page (None on the last page).
+async def search_posts_and_comments(db: AsyncSession, q: str, kind: str = "all", author: str = None, limit: int = 20, offset: int = 0):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+    # A query with nothing to look for, only exclusions (-beach), matches almost every row and
+    # cannot use the GIN indexes; querytree() reduces it to 'T'. Checked once, before any scan.
+    has_terms = func.querytree(query) != "T"
+
+    # Matching rows come from the GIN indexes; only they are ranked
+    hits = []
+    if kind in ("all", "posts"):
+        post_hits = select(
+            literal("post").label("kind"),
+            Post.post_id.label("post_id"),
+            Post.post_id.label("hit_id"),
+            Post.user_email.label("user_email"),
+            Post.created_at.label("created_at"),
+            func.ts_rank(Post.search_vector, query).label("rank"),
+        ).where(has_terms, Post.search_vector.op("@@")(query))
+        if author:
+            post_hits = post_hits.where(Post.user_email == author)
+        hits.append(post_hits)
+    if kind in ("all", "comments"):
+        comment_hits = select(
+            literal("comment").label("kind"),
+            Comment.post_id.label("post_id"),
+            Comment.comment_id.label("hit_id"),
+            Comment.user_email.label("user_email"),
+            Comment.created_at.label("created_at"),
+            func.ts_rank(Comment.search_vector, query).label("rank"),
+        ).where(has_terms, Comment.search_vector.op("@@")(query))
+        if author:
+            comment_hits = comment_hits.where(Comment.user_email == author)
+        hits.append(comment_hits)
+
+    # Pick the page first (one extra row tells whether there is a next page)
+    ranked = union_all(*hits).subquery("hits") if len(hits) > 1 else hits[0].subquery("hits")
+    order = (ranked.c.rank.desc(), ranked.c.created_at.desc(), ranked.c.hit_id.desc())
+    page = select(ranked).order_by(*order).limit(limit + 1).offset(offset).subquery("page")
+
+    # ...then build snippets for that page only (ts_headline re-parses the text, so it is the expensive part)
+    matched_text = func.coalesce(Comment.text, Post.caption)
+    rows = (await db.execute(
+        select(
+            page.c.kind,
+            page.c.post_id,
+            page.c.hit_id,
+            page.c.user_email,
+            page.c.created_at,
+            page.c.rank,
+            func.ts_headline(SEARCH_CONFIG, matched_text, query, SEARCH_SNIPPET_OPTIONS).label("snippet"),
+        )
+        .outerjoin(Post, and_(page.c.kind == "post", Post.post_id == page.c.hit_id))
+        .outerjoin(Comment, and_(page.c.kind == "comment", Comment.comment_id == page.c.hit_id))
+        .order_by(page.c.rank.desc(), page.c.created_at.desc(), page.c.hit_id.desc())
+    )).all()
+
+    next_offset = offset + limit if len(rows) > limit else None
+    return rows[:limit], next_offset
+
+# Edit Comment
+async def edit_comment(db: AsyncSession, comment_id: str, text: str, user_email: str):
+    comment = await get_comment_by_id(db, comment_id)
+    if not comment:
+        raise Exception("Comment not found")
+
+    # Ensure that the user can only edit their own comment
+    if comment.user_email != user_email:
+        raise Exception("You can only edit your own comment")
+
+    # Update the comment's text
+    comment.text = text
+    await db.commit()
+    return comment
+
+# Delete Comment
+async def delete_comment(db: AsyncSession, comment_id: str, user_email: str):
+    comment = await get_comment_by_id(db, comment_id)
+    if not comment:
+        raise Exception("Comment not found")
+
+    # Ensure the authenticated user is the owner of the comment
+    if comment.user_email != user_email:
+        raise Exception("You are not allowed to delete this comment")
+
+    # Delete the comment
+    await db.delete(comment)
+    await db.commit()
+    return comment
@@ -0,0 +1,130 @@
+# database.py
+import os
+from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+# Secure Database URL (use environment variable or .env file)
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/mydb")
+
+# Same database through the asyncpg driver
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", make_url(DATABASE_URL).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False))
+
+# Use the native async (asyncpg) path; set DB_ASYNC=false to run sync Sessions in the threadpool instead
+DB_ASYNC = os.getenv("DB_ASYNC", "true").lower() in ("1", "true", "yes")
+
+# Connection pool settings (per worker process, shared by both paths)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Prepared statements cached per asyncpg connection (set to 0 behind pgbouncer in transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+POOL_SETTINGS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# Create SQLAlchemy engine (No `connect_args` for PostgreSQL)
+engine = create_engine(DATABASE_URL, **POOL_SETTINGS)
+
+# Async engine on asyncpg (connects lazily, so it costs nothing when DB_ASYNC is off)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,  # asyncpg's own cache
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,  # SQLAlchemy's asyncpg dialect cache
+    },
+    **POOL_SETTINGS,
+)
+
+# Create a session local to interact with the database
+# (objects stay usable after commit, so handlers don't trigger lazy reloads)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Base class for models
+Base = declarative_base()
+
+# The subset of the AsyncSession API used by crud.py and the routers, backed by a sync Session
+# whose blocking calls run in the threadpool. This is the DB_ASYNC=false path.
+class SyncSessionAdapter:
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.execute, statement, params)
+
+    async def scalar(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params)
+
+    async def scalars(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params)
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+# Open a database session for the configured path (AsyncSession, or a sync Session behind SyncSessionAdapter)
+@asynccontextmanager
+async def session_scope():
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SyncSessionAdapter(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# Dependency to get the database session
+async def get_db():
+    async with session_scope() as db:
+        yield db
+
+# Function to create tables (Optional, can be run at startup)
+def init_db():
+    from models import Base  # Import models to ensure they are registered
+    from migrations import upgrade_schema
+    Base.metadata.create_all(bind=engine)
+    # Bring tables created by older versions up to date (new columns and indexes)
+    upgrade_schema(engine)
+
+# Release pooled connections (called on application shutdown)
+async def close_db():
+    await async_engine.dispose()
+    engine.dispose()
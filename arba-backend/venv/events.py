@@ -0,0 +1,264 @@
+# events.py
+# Real-time push of post and comment changes.
+#
+# Write paths publish compact events after committing. A broker carries them to every worker
+# (in memory for a single worker, Postgres LISTEN/NOTIFY for several), and each worker's hub fans
+# them out to the WebSocket subscribers of the matching topics:
+#   "posts"          post.created / post.updated / post.deleted of every post
+#   "post:<post_id>" post.updated / post.deleted of that post, and comment.* on it
+#
+# Every subscriber has a bounded queue. A subscriber that falls behind has its backlog dropped
+# and gets a single {"type": "resync"} message instead, telling it to refetch what it shows.
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per subscriber before it is told to resync
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+
+# Most topics one connection may subscribe to (one feed page is one topic per post)
+EVENTS_MAX_TOPICS = int(os.getenv("EVENTS_MAX_TOPICS", "500"))
+
+# How events reach the other workers: "memory" (single worker) or "postgres" (LISTEN/NOTIFY)
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "memory")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "arba_events")
+
+# NOTIFY payloads must stay under 8000 bytes; larger events are sent without their data
+NOTIFY_MAX_PAYLOAD = 7900
+
+# Topics
+POSTS_TOPIC = "posts"
+
+def post_topic(post_id) -> str:
+    return f"post:{str(post_id).lower()}"
+
+RESYNC_MESSAGE = json.dumps({"type": "resync"})
+
+# Event for a created, updated or deleted post (post is its PostResponse, if any)
+def post_event(action: str, post_id, post=None) -> dict:
+    event = {"type": f"post.{action}", "post_id": str(post_id)}
+    if post is not None:
+        event["post"] = jsonable_encoder(post)
+    return event
+
+# Event for a created, updated or deleted comment (comment is its CommentResponse, if any)
+def comment_event(action: str, post_id, comment_id, comment=None) -> dict:
+    event = {"type": f"comment.{action}", "post_id": str(post_id), "comment_id": str(comment_id)}
+    if comment is not None:
+        event["comment"] = jsonable_encoder(comment)
+    return event
+
+# The topics an event is delivered to
+def event_topics(event: dict):
+    topics = [post_topic(event["post_id"])]
+    if event["type"].startswith("post."):
+        topics.append(POSTS_TOPIC)
+    return topics
+
+# Whether a client may subscribe to this topic
+def is_valid_topic(topic: str) -> bool:
+    if topic == POSTS_TOPIC:
+        return True
+    prefix, _, post_id = topic.partition(":")
+    return prefix == "post" and 0 < len(post_id) <= 64
+
+# One connected client: its topics and its bounded queue of serialized messages
+class Subscription:
+    def __init__(self, max_queue: int):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.topics = set()
+        self.resyncs = 0  # How many times the backlog was dropped
+
+    def offer(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client fell behind: its backlog is useless now, have it refetch instead
+            self.resyncs += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_MESSAGE)
+
+# In-process fan-out of events to subscriptions (only used from the event loop)
+class EventHub:
+    def __init__(self, max_queue: int = EVENTS_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscribers = defaultdict(set)  # topic -> subscriptions
+        self._subscriptions = set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_queue)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def add_topics(self, subscription: Subscription, topics):
+        for topic in topics:
+            subscription.topics.add(topic)
+            self._subscribers[topic].add(subscription)
+
+    def remove_topics(self, subscription: Subscription, topics):
+        for topic in topics:
+            subscription.topics.discard(topic)
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def unsubscribe(self, subscription: Subscription):
+        self.remove_topics(subscription, list(subscription.topics))
+        self._subscriptions.discard(subscription)
+
+    # Deliver an event to everyone subscribed to one of its topics (serialized once)
+    def dispatch(self, event: dict):
+        targets = set()
+        for topic in event_topics(event):
+            targets.update(self._subscribers.get(topic, ()))
+        if not targets:
+            return
+        message = json.dumps(event)
+        for subscription in targets:
+            subscription.offer(message)
+
+    # Tell every subscriber to refetch (events may have been missed)
+    def resync_all(self):
+        for subscription in self._subscriptions:
+            subscription.offer(RESYNC_MESSAGE)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+# Interface for carrying events between workers. Every published event must be delivered
+# exactly once to every worker's deliver callback, this worker's included.
+class Broker:
+    async def start(self, deliver: Callable[[dict], None]):
+        raise NotImplementedError
+
+    async def publish(self, event: dict):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+# Events stay in this process (single worker, and tests)
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, event):
+        if self._deliver is not None:
+            self._deliver(event)
+
+# Events go through Postgres NOTIFY on EVENTS_CHANNEL and come back to every worker via LISTEN
+class PostgresBroker(Broker):
+    def __init__(self, dsn: str, channel: str = EVENTS_CHANNEL):
+        self.dsn = dsn
+        self.channel = channel
+        self._deliver = None
+        self._connection = None
+        self._lock = asyncio.Lock()  # One query at a time on the connection
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self, deliver):
+        self._deliver = deliver
+        self._stopping = False
+        await self._connect()
+
+    async def _connect(self):
+        import asyncpg
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.channel, self._on_notify)
+        connection.add_termination_listener(self._on_terminated)
+        self._connection = connection
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed event on %s", channel)
+            return
+        self._deliver(event)
+
+    def _on_terminated(self, connection):
+        self._connection = None
+        if not self._stopping and self._reconnect_task is None:
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    # Reconnect with backoff; events sent in between are lost, so every subscriber resyncs
+    async def _reconnect(self):
+        delay = 0.5
+        try:
+            while not self._stopping:
+                try:
+                    await self._connect()
+                    break
+                except Exception as error:
+                    logger.warning("Event broker reconnect failed: %s", error)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+            hub.resync_all()
+        finally:
+            self._reconnect_task = None
+
+    async def publish(self, event):
+        payload = json.dumps(event)
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_PAYLOAD:
+            # Too big for NOTIFY: send only the ids, clients fetch the rest
+            payload = json.dumps({key: value for key, value in event.items() if key not in ("post", "comment")})
+        if self._connection is None:
+            raise ConnectionError("Event broker is not connected")
+        async with self._lock:
+            await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.remove_termination_listener(self._on_terminated)
+            await connection.close()
+
+# The broker configured by EVENTS_BROKER
+def default_broker() -> Broker:
+    if EVENTS_BROKER == "postgres":
+        from database import DATABASE_URL
+        return PostgresBroker(make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+    return InMemoryBroker()
+
+hub = EventHub()
+broker: Broker = default_broker()
+
+# Use a different broker (call before start_events)
+def set_broker(new_broker: Broker):
+    global broker
+    broker = new_broker
+
+# Start receiving events (called on application startup)
+async def start_events():
+    await broker.start(hub.dispatch)
+
+# Stop receiving events (called on application shutdown)
+async def stop_events():
+    await broker.stop()
+
+# Publish an event; call after the write has been committed. A failed push never fails the
+# request: clients resync when the broker comes back.
+async def publish(event: dict):
+    try:
+        await broker.publish(event)
+    except Exception as error:
+        logger.warning("Could not publish %s event: %s", event["type"], error)
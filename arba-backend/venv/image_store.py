@@ -0,0 +1,104 @@
+# image_store.py
+# Content-addressed image storage on local disk.
+# Every image is stored once under the SHA-256 digest of its bytes, so identical uploads
+# are deduplicated and a stored file never changes (which makes it safe to cache forever).
+import hashlib
+import io
+import os
+import re
+import tempfile
+from typing import Optional
+
+# Root of the blob store (the uploads/ directory next to this file by default)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
+
+# Largest accepted upload, in bytes (10 MB by default)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Uploads are copied into the store this many bytes at a time
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Raised when an upload is larger than the configured maximum
+class ImageTooLargeError(ValueError):
+    pass
+
+# Lowercase hex SHA-256
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# Leading bytes of the image formats we expect to receive
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+# Check that a string is a digest produced by this store (also guards against path traversal)
+def is_valid_digest(digest: str) -> bool:
+    return bool(DIGEST_PATTERN.fullmatch(digest))  # Exactly 64 hex characters (no trailing newline)
+
+# Location of an image on disk, sharded by the first two hex characters
+def image_path(digest: str) -> str:
+    return os.path.join(UPLOAD_DIR, digest[:2], digest)
+
+# Location of a resized variant of an image (see image_variants.py)
+def variant_path(digest: str, width: int) -> str:
+    return f"{image_path(digest)}_w{width}"
+
+# Public URL of an image (served by routers/prod/image_router.py), optionally of a resized variant
+def image_url(digest: Optional[str], width: Optional[int] = None) -> Optional[str]:
+    if not digest:
+        return None
+    if width:
+        return f"/images/{digest}?w={width}"
+    return f"/images/{digest}"
+
+# Store image bytes and return their digest. Writing an image that already exists is a no-op.
+def save_image(data: bytes) -> str:
+    return save_image_stream(io.BytesIO(data))
+
+# Copy a file object into the store chunk by chunk, hashing as we go, and return its digest.
+# At most one chunk is held in memory; raises ImageTooLargeError past max_bytes.
+def save_image_stream(source, max_bytes: Optional[int] = None) -> str:
+    # Write to a temporary file first, then rename, so readers never see a partial file
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".tmp")
+    try:
+        hasher = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, "wb") as tmp_file:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+
+        digest = hasher.hexdigest()
+        path = image_path(digest)
+        if os.path.exists(path):
+            # Already stored, drop the duplicate
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return digest
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+# Detect the media type of a stored image from its first bytes
+def guess_media_type(path: str) -> str:
+    with open(path, "rb") as image_file:
+        head = image_file.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    return "application/octet-stream"
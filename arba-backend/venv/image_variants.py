@@ -0,0 +1,190 @@
+# image_variants.py
+# Background generation of resized image variants (thumbnail and feed sizes).
+# Resizing is CPU-bound, so it runs in a small process pool, off the event loop and out of
+# the request path. The queue in front of the pool is bounded; when it is full new jobs are
+# dropped and picked up again the next time the variant is requested.
+import importlib.util
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from image_store import image_path, variant_path
+
+logger = logging.getLogger(__name__)
+
+# Widths (in pixels) to generate for every image, smallest first. The smallest one is the thumbnail.
+VARIANT_WIDTHS = sorted(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "160,480,1080").split(","))
+
+# Re-encode variants to this Pillow format (e.g. "WEBP", "JPEG"); empty keeps the original format
+VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "").upper()
+VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+
+# Worker processes, and how many images may be queued or in progress at once
+VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+VARIANT_MAX_PENDING = int(os.getenv("IMAGE_VARIANT_MAX_PENDING", "32"))
+
+# Images with more pixels than this are served as-is (a small PNG can decode to gigabytes)
+VARIANT_MAX_PIXELS = int(os.getenv("IMAGE_VARIANT_MAX_PIXELS", str(50_000_000)))
+
+# Pillow is optional: without it only the originals are served
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+_executor: Optional[ProcessPoolExecutor] = None
+_starting = False  # A replacement pool is being started
+_pending = threading.BoundedSemaphore(VARIANT_MAX_PENDING)
+_in_flight = set()  # Digests queued or being processed
+_lock = threading.Lock()
+
+# Marker written once an image has been processed, whether or not its variants could be generated
+def done_marker_path(digest: str) -> str:
+    return f"{image_path(digest)}.variants"
+
+def _write_done_marker(digest: str, status: bytes = b""):
+    with open(done_marker_path(digest), "wb") as marker:
+        marker.write(status)
+
+# Resize one image to every configured width. Runs in a worker process.
+# Any failure (unreadable, truncated, too large, ...) still writes the done marker, so the
+# original is served from then on and the job is never retried.
+def generate_variants(digest: str, widths, image_format: str, quality: int):
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = VARIANT_MAX_PIXELS  # Pillow's own decompression bomb guard
+    try:
+        _resize_variants(digest, widths, image_format, quality)
+    except Exception as error:
+        logger.warning("Cannot generate variants for image %s: %s", digest, error)
+        _write_done_marker(digest, b"failed")
+        return
+    _write_done_marker(digest)
+
+def _resize_variants(digest: str, widths, image_format: str, quality: int):
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path(digest)) as source:
+        # Image.open only reads the header; refuse to decode huge images
+        if source.width * source.height > VARIANT_MAX_PIXELS:
+            raise ValueError(f"{source.width}x{source.height} is over {VARIANT_MAX_PIXELS} pixels")
+        output_format = image_format or source.format
+        original = ImageOps.exif_transpose(source)
+        for width in widths:
+            # Never upscale; clients asking for a larger width get the original
+            if width >= original.width:
+                continue
+            destination = variant_path(digest, width)
+            if os.path.exists(destination):
+                continue
+
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            if output_format == "JPEG" and resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+
+            # Write to a temporary file first, then rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tmp_file:
+                    resized.save(tmp_file, format=output_format, quality=quality, optimize=True)
+                os.replace(tmp_path, destination)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+# Start the worker processes (called on application startup, off the event loop: bringing up
+# the forkserver and its workers takes a while). Without workers only the originals are served.
+def start_variant_workers():
+    global _executor, _starting
+    if not PILLOW_AVAILABLE or not VARIANT_WIDTHS:
+        return
+    try:
+        # Don't fork the threaded server process; start workers from a clean forkserver
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        executor = ProcessPoolExecutor(max_workers=VARIANT_WORKERS, mp_context=multiprocessing.get_context(start_method))
+        # Bring every worker up now rather than on the first upload
+        for future in [executor.submit(os.getpid) for _ in range(VARIANT_WORKERS)]:
+            future.result()
+    except Exception as error:
+        logger.warning("Cannot start image variant workers: %s", error)
+        executor = None
+    with _lock:
+        previous, _executor = _executor, executor
+        _starting = False
+    if previous is not None:
+        previous.shutdown(wait=False, cancel_futures=True)
+
+# Replace a broken pool in the background; jobs dropped meanwhile are retried when requested again
+def _restart_variant_workers():
+    global _starting
+    shutdown_variant_workers()
+    with _lock:
+        if _starting:
+            return
+        _starting = True
+    threading.Thread(target=start_variant_workers, name="image-variant-workers", daemon=True).start()
+
+def _release(digest: str):
+    with _lock:
+        _in_flight.discard(digest)
+    _pending.release()
+
+def _on_done(digest: str, future):
+    _release(digest)
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Generating variants for image %s failed: %s", digest, future.exception())
+
+# Queue variant generation for an image without waiting for it. Returns False if it was not queued.
+def schedule_variants(digest: str) -> bool:
+    if not PILLOW_AVAILABLE or not VARIANT_WIDTHS:
+        return False
+    # Already processed (e.g. the same image uploaded again): nothing to do
+    if os.path.exists(done_marker_path(digest)):
+        return True
+    with _lock:
+        executor = _executor
+        if executor is None:
+            return False  # Workers not running (yet)
+        if digest in _in_flight:
+            return True
+        if not _pending.acquire(blocking=False):
+            logger.warning("Image variant queue is full, skipping %s for now", digest)
+            return False
+        _in_flight.add(digest)
+    try:
+        future = executor.submit(generate_variants, digest, VARIANT_WIDTHS, VARIANT_FORMAT, VARIANT_QUALITY)
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool
+        _release(digest)
+        _restart_variant_workers()
+        return False
+    except BaseException:
+        _release(digest)
+        raise
+    future.add_done_callback(lambda done: _on_done(digest, done))
+    return True
+
+# Pick the file to serve for a request of the given width: the smallest variant at least that wide.
+# Returns (path, variant_width, final); variant_width is None for the original, and final is
+# False while variants are still missing, so the answer for this width may still change.
+def resolve_variant(digest: str, width: int):
+    final = os.path.exists(done_marker_path(digest))
+    for variant_width in VARIANT_WIDTHS:
+        if variant_width >= width and os.path.exists(variant_path(digest, variant_width)):
+            return variant_path(digest, variant_width), variant_width, final
+    if not final:
+        # Not generated yet (or dropped earlier), try again in the background
+        schedule_variants(digest)
+    return image_path(digest), None, final
+
+# Stop the worker processes (called on application shutdown)
+def shutdown_variant_workers():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
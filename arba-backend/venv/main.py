@@ -0,0 +1,64 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from routers.prod.post_router import router as post_router
+from routers.prod.user_router import router as user_router
+from routers.prod.comment_router import router as comment_router
+from routers.prod.image_router import router as image_router
+from routers.prod.event_router import router as event_router
+from routers.prod.search_router import router as search_router
+from database import init_db, close_db  # Import the init_db function
+from fastapi.concurrency import run_in_threadpool
+from image_variants import start_variant_workers, shutdown_variant_workers
+from auth import shutdown_password_executor
+from events import start_events, stop_events
+from routers.prod.metrics_router import router as metrics_router
+from metrics import MetricsMiddleware, TimedJSONResponse, instrument_engines
+from database import engine, async_engine
+
+app = FastAPI(default_response_class=TimedJSONResponse)  # JSON rendering time shows up in the metrics
+
+# Per-request latency, query count and sizes, exposed at /metrics
+instrument_engines(engine, async_engine.sync_engine)
+app.add_middleware(MetricsMiddleware)
+
+# CORS configuration (restrict origins in production)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Change this for production
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Include routers
+app.include_router(user_router)
+app.include_router(post_router)
+app.include_router(comment_router)
+app.include_router(image_router)
+app.include_router(search_router)
+app.include_router(event_router)
+app.include_router(metrics_router)
+
+# Root endpoint
+@app.get("/")
+def read_root():
+    return {"Hello": "World"}
+
+# Optional: Startup and shutdown events
+@app.on_event("startup")
+async def startup_event():
+    print("Starting up G...")
+    # Call the init_db function to create tables
+    init_db()
+    # Start receiving post and comment events for the push channel
+    await start_events()
+    # Start the image resizing workers (in the threadpool, so the event loop keeps running)
+    await run_in_threadpool(start_variant_workers)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    print("Shutting down G...")
+    await stop_events()
+    shutdown_variant_workers()
+    shutdown_password_executor()
+    await close_db()
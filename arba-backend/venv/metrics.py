@@ -0,0 +1,227 @@
+# metrics.py
+# Per-request instrumentation: latency, database query count and time, serialization time and
+# response size, recorded per route and exposed in the Prometheus text format (GET /metrics).
+# Requests that are slow, or run suspiciously many queries (N+1), are logged.
+#
+# MetricsMiddleware opens a RequestStats for each HTTP request in a context variable. SQLAlchemy
+# cursor events on both engines add every query to it; the context variable follows the request
+# into the threadpool (DB_ASYNC=false) and into streamed bodies.
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this (seconds), or running more queries than this, are logged
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", "20"))
+
+# Histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SERIALIZATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# What one request did
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.response_bytes = 0
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Monotonic counter per label set
+class Counter:
+    def __init__(self, name: str, help: str, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}")
+        return lines
+
+# Cumulative histogram per label set
+class Histogram:
+    def __init__(self, name: str, help: str, buckets, label_names=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        label_names = self.label_names + ("le",)
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(label_names, labels + (bound,))} {count}")
+                count = series[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(label_names, labels + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_number(series[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+ROUTE_LABELS = ("method", "route")
+
+requests_total = Counter("http_requests_total", "HTTP requests handled.", ROUTE_LABELS + ("status",))
+request_duration = Histogram("http_request_duration_seconds", "Time to handle a request, body included.", LATENCY_BUCKETS, ROUTE_LABELS)
+request_queries = Histogram("http_request_db_queries", "Database queries run per request.", QUERY_COUNT_BUCKETS, ROUTE_LABELS)
+request_db_time = Histogram("http_request_db_seconds", "Time spent in database queries per request.", LATENCY_BUCKETS, ROUTE_LABELS)
+request_serialization_time = Histogram("http_request_serialization_seconds", "Time spent rendering JSON per request.", SERIALIZATION_BUCKETS, ROUTE_LABELS)
+response_size = Histogram("http_response_size_bytes", "Response body size.", RESPONSE_SIZE_BUCKETS, ROUTE_LABELS)
+db_queries_total = Counter("db_queries_total", "Database queries run, inside requests or not.")
+db_query_seconds_total = Counter("db_query_seconds_total", "Time spent in database queries, inside requests or not.")
+
+METRICS = [requests_total, request_duration, request_queries, request_db_time, request_serialization_time, response_size, db_queries_total, db_query_seconds_total]
+
+# All metrics in the Prometheus text format; gauges is a list of (name, help, value) read at scrape time
+def render_metrics(gauges=()) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, help, value in gauges:
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_format_number(value)}"])
+    return "\n".join(lines) + "\n"
+
+# Count the time spent in the block as serialization of the current request
+@contextmanager
+def timed_serialization():
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization_seconds += perf_counter() - started
+
+# FastAPI's JSONResponse, with rendering counted as serialization time
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with timed_serialization():
+            return super().render(content)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_started"].pop()
+    db_queries_total.inc()
+    db_query_seconds_total.inc(amount=elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+# A failed query never reaches after_cursor_execute
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+# Time every query run through the given (sync) engines
+def instrument_engines(*engines):
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+
+# Record a finished request, and log it if it was slow or ran too many queries
+def record_request(method: str, route: str, path: str, status_code: int, duration: float, stats: RequestStats):
+    labels = (method, route)
+    requests_total.inc(labels + (str(status_code),))
+    request_duration.observe(labels, duration)
+    request_queries.observe(labels, stats.queries)
+    request_db_time.observe(labels, stats.db_seconds)
+    request_serialization_time.observe(labels, stats.serialization_seconds)
+    response_size.observe(labels, stats.response_bytes)
+
+    if duration >= SLOW_REQUEST_SECONDS or stats.queries > SLOW_REQUEST_QUERIES:
+        logger.warning(
+            "Slow request %s %s -> %s: %.3fs, %d queries (%.3fs in the database), %.3fs serializing, %d bytes",
+            method, path, status_code, duration, stats.queries, stats.db_seconds, stats.serialization_seconds, stats.response_bytes,
+        )
+
+# ASGI middleware measuring every HTTP request (WebSockets are passed through)
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        content_length = None
+        started = perf_counter()
+
+        async def send_and_measure(message):
+            nonlocal status_code, content_length
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-length":
+                        content_length = int(value)
+            elif message["type"] == "http.response.body":
+                stats.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            duration = perf_counter() - started
+            current_request.reset(token)
+            # Files may be sent without passing through body messages
+            if not stats.response_bytes and content_length and scope["method"] != "HEAD":
+                stats.response_bytes = content_length
+            # Label by route template (/posts/{post_id}), not by path, to keep the series bounded
+            route = scope.get("route")
+            record_request(scope["method"], route.path if route is not None else "unmatched", scope["path"], status_code, duration, stats)
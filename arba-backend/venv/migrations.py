@@ -0,0 +1,79 @@
+# migrations.py
+# Idempotent schema upgrades for databases created by an older version of the app.
+# Base.metadata.create_all only creates missing tables, so columns and indexes added
+# to an existing table have to be applied here as well. Every statement must be safe
+# to run on every startup.
+import sys
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+from models import SEARCH_CONFIG
+
+SCHEMA_UPGRADES = [
+    # Feed ordering: posts.created_at and the keyset index behind GET /posts
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')",
+    "CREATE INDEX IF NOT EXISTS ix_posts_created_at_post_id ON posts (created_at, post_id)",
+    # Image store: posts reference their image by digest instead of holding the bytes
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS image_digest VARCHAR(64)",
+    # Comments per post in time order
+    "CREATE INDEX IF NOT EXISTS ix_comments_post_id_created_at ON comments (post_id, created_at)",
+    # Response cache version counters shared by all workers (RESPONSE_CACHE_BACKEND=postgres)
+    "CREATE TABLE IF NOT EXISTS resource_versions (key TEXT PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0)",
+    # Full-text search (GET /search): generated tsvector columns (adding one rewrites the table once) and GIN indexes
+    f"ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', caption)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING gin (search_vector)",
+    f"ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', text)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_comments_search_vector ON comments USING gin (search_vector)",
+    # Author filters, and the ON DELETE CASCADE from users
+    "CREATE INDEX IF NOT EXISTS ix_posts_user_email ON posts (user_email)",
+    "CREATE INDEX IF NOT EXISTS ix_comments_user_email ON comments (user_email)",
+]
+
+# Number of posts moved per transaction by migrate_images
+IMAGE_MIGRATION_BATCH_SIZE = 50
+
+# Apply all schema upgrades in a single transaction
+def upgrade_schema(engine):
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+# One-shot data migration: move inline BYTEA images into the image store.
+# Safe to interrupt and re-run; each batch is committed on its own.
+def migrate_images(batch_size: int = IMAGE_MIGRATION_BATCH_SIZE):
+    from database import SessionLocal
+    from models import Post
+    from image_store import save_image
+
+    db = SessionLocal()
+    moved = 0
+    try:
+        while True:
+            posts = (
+                db.query(Post)
+                .options(undefer(Post.image))
+                .filter(Post.image.isnot(None))
+                .limit(batch_size)
+                .all()
+            )
+            if not posts:
+                break
+            for post in posts:
+                post.image_digest = save_image(post.image)
+                post.image = None
+            db.commit()
+            moved += len(posts)
+            print(f"Moved {moved} images...")
+    finally:
+        db.close()
+    return moved
+
+if __name__ == "__main__":
+    # Usage: python migrations.py [upgrade-schema | migrate-images]
+    from database import init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade-schema"
+    init_db()  # Always bring the schema up to date first
+    if command == "migrate-images":
+        print(f"Done, moved {migrate_images()} images to the image store")
+    elif command != "upgrade-schema":
+        sys.exit(f"Unknown command: {command}")
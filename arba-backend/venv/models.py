@@ -0,0 +1,68 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, Computed
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import UUID, BYTEA, TSVECTOR
+from database import Base
+import uuid
+from datetime import datetime  # Import datetime for created_at timestamp
+
+# Text search configuration of the search_vector columns (GET /search must use the same one)
+SEARCH_CONFIG = "english"
+
+# User Model
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True, nullable=False)
+    email = Column(String, unique=True, index=True, nullable=False)
+    password = Column(String, nullable=False)
+
+    posts = relationship("Post", back_populates="owner", cascade="all, delete-orphan")
+    comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan")
+
+# Post Model
+class Post(Base):
+    __tablename__ = "posts"
+
+    post_id = Column(UUID(as_uuid=True), primary_key=True, default=lambda: uuid.uuid4())
+    caption = Column(Text, nullable=False)
+    image = deferred(Column(BYTEA, nullable=True))  # Legacy inline image, moved to the image store by `python migrations.py migrate-images`
+    image_digest = Column(String(64), nullable=True)  # SHA-256 of the image in the image store
+    user_email = Column(String, ForeignKey("users.email", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Feed ordering (newest first)
+    search_vector = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', caption)", persisted=True)))  # Kept up to date by Postgres
+
+    owner = relationship("User", back_populates="posts")
+    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
+
+    # Keyset index for the feed: ORDER BY created_at DESC, post_id DESC
+    # GIN index for full-text search, and the author filter (also used by ON DELETE CASCADE from users)
+    __table_args__ = (
+        Index("ix_posts_created_at_post_id", "created_at", "post_id"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_posts_user_email", "user_email"),
+    )
+    __mapper_args__ = {"eager_defaults": False}  # Don't fetch search_vector back on every INSERT/UPDATE
+
+# Comment Model
+class Comment(Base):
+    __tablename__ = "comments"
+
+    comment_id = Column(UUID(as_uuid=True), primary_key=True, default=lambda: uuid.uuid4())
+    text = Column(Text, nullable=False)
+    post_id = Column(UUID(as_uuid=True), ForeignKey("posts.post_id", ondelete="CASCADE"), nullable=False)
+    user_email = Column(String, ForeignKey("users.email", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Use datetime.utcnow for a timestamp
+    search_vector = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', text)", persisted=True)))  # Kept up to date by Postgres
+
+    post = relationship("Post", back_populates="comments")
+    author = relationship("User", back_populates="comments")
+
+    # Comments of a post in time order (GET /comments, feed previews)
+    # GIN index for full-text search, and the author filter (also used by ON DELETE CASCADE from users)
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at"),
+        Index("ix_comments_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_comments_user_email", "user_email"),
+    )
+    __mapper_args__ = {"eager_defaults": False}  # Don't fetch search_vector back on every INSERT/UPDATE
@@ -0,0 +1,188 @@
+# response_cache.py
+# In-process cache of rendered JSON responses, with strong ETags and conditional GET support.
+#
+# Each cached response depends on one or more resources ("feed", "comments:<post_id>", ...).
+# Every resource has a version counter that write paths bump, and the versions are part of the
+# cache key, so a write makes the old entries unreachable without having to find them. Old
+# entries then age out of the size-bounded LRU.
+#
+# Version counters live in a pluggable backend: in memory by default (one worker), or in
+# Postgres with RESPONSE_CACHE_BACKEND=postgres so all workers see each other's writes.
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import text
+
+from metrics import timed_serialization
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached response bodies, in bytes
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Where version counters live: "memory" or "postgres"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+
+# Attempts at bumping versions after a write before giving up
+INVALIDATE_ATTEMPTS = int(os.getenv("RESPONSE_CACHE_INVALIDATE_ATTEMPTS", "3"))
+
+# Clients may keep responses but must revalidate them (cheap with If-None-Match)
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+# Resources
+FEED = "feed"  # Posts (any create, edit or delete)
+ALL_COMMENTS = "comments"  # Any comment anywhere (feed pages with embedded comments)
+
+def comments_key(post_id) -> str:
+    return f"comments:{str(post_id).lower()}"  # UUIDs may arrive in either case
+
+# Check an If-None-Match header against an ETag
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+# Interface for version counter storage. Both calls get the request's own database session, so
+# a backend that needs the database never takes a second pooled connection while the request
+# already holds one.
+class VersionBackend:
+    async def get_versions(self, db, keys):
+        """Current version of each key, in order (0 for keys never bumped)."""
+        raise NotImplementedError
+
+    async def bump(self, db, *keys):
+        """Increment the version of each key."""
+        raise NotImplementedError
+
+# Version counters in this process only
+class InMemoryVersionBackend(VersionBackend):
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    async def get_versions(self, db, keys):
+        with self._lock:
+            return [self._versions.get(key, 0) for key in keys]
+
+    async def bump(self, db, *keys):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+# Version counters in a Postgres table shared by every worker
+class PostgresVersionBackend(VersionBackend):
+    async def get_versions(self, db, keys):
+        rows = (await db.execute(
+            text("SELECT key, version FROM resource_versions WHERE key = ANY(:keys)"),
+            {"keys": list(keys)},
+        )).all()
+        versions = dict(rows)
+        return [versions.get(key, 0) for key in keys]
+
+    # Called after the write committed; commits the bumps on the same session
+    async def bump(self, db, *keys):
+        for key in sorted(set(keys)):  # Fixed order so concurrent bumps cannot deadlock
+            await db.execute(
+                text(
+                    "INSERT INTO resource_versions (key, version) VALUES (:key, 1) "
+                    "ON CONFLICT (key) DO UPDATE SET version = resource_versions.version + 1"
+                ),
+                {"key": key},
+            )
+        await db.commit()
+
+# Size-bounded LRU of cache key -> (etag, body)
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag: str, body: bytes):
+        # Responses too large to be worth keeping are not cached
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted_body) = self._entries.popitem(last=False)
+                self._size -= len(evicted_body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+version_backend: VersionBackend = PostgresVersionBackend() if RESPONSE_CACHE_BACKEND == "postgres" else InMemoryVersionBackend()
+
+# Use a different version backend (e.g. one shared by all workers)
+def set_version_backend(backend: VersionBackend):
+    global version_backend
+    version_backend = backend
+
+# Mark resources as changed; call with the request's session after the write has been committed.
+# A failed bump never fails the request (the write is already in): it is retried, and if the
+# backend stays down this worker's entries are dropped and the error logged.
+async def invalidate(db, *keys):
+    for attempt in range(1, INVALIDATE_ATTEMPTS + 1):
+        try:
+            await version_backend.bump(db, *keys)
+            return
+        except Exception as error:
+            await db.rollback()  # Leave the session usable for the next attempt
+            if attempt == INVALIDATE_ATTEMPTS:
+                response_cache.clear()
+                logger.warning("Could not invalidate %s: %s", ", ".join(keys), error)
+                return
+            await asyncio.sleep(0.05 * attempt)
+
+# Render JSON the way FastAPI's JSONResponse does
+def render_json(content) -> bytes:
+    with timed_serialization():
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+# Serve a JSON response built by `build` (an async function), from the cache while none of the
+# resources it depends on have changed. Answers If-None-Match with 304. db is the request's session.
+async def cached_json_response(request: Request, db, keys, build) -> Response:
+    versions = await version_backend.get_versions(db, keys)
+    cache_key = (request.url.path, request.url.query, tuple(zip(keys, versions)))
+
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        body = render_json(await build())
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        response_cache.put(cache_key, etag, body)
+    else:
+        etag, body = entry
+
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
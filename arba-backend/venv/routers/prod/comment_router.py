@@ -0,0 +1,160 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID, uuid4
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+from models import Comment, Post
+from schemas import CommentCreate, CommentResponse, PostComments
+from database import get_db
+from crud import get_comments_for_post as query_comments_for_post, get_comments_for_posts
+from auth import Principal, get_current_user
+from response_cache import cached_json_response, invalidate, ALL_COMMENTS, comments_key
+from events import publish, comment_event
+
+router = APIRouter()
+
+# Page size limits for comment listings
+MAX_COMMENTS_PAGE_SIZE = 100
+DEFAULT_BATCH_COMMENTS = 3
+
+# Most posts accepted by one GET /comments/batch call (one feed page)
+MAX_BATCH_POSTS = 100
+
+# Build the API representation of a comment
+def to_comment_response(comment: Comment) -> CommentResponse:
+    return CommentResponse(
+        comment_id=comment.comment_id,
+        user_email=comment.user_email,
+        post_id=comment.post_id,
+        text=comment.text,
+        created_at=comment.created_at
+    )
+
+# Route to create a comment on a post
+@router.post("/comments", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
+async def create_comment(comment: CommentCreate, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The authenticated (and existing) user
+    user_email = user.email
+
+    # Check if the post exists
+    post = await db.scalar(select(Post).where(Post.post_id == comment.post_id))
+    if not post:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    
+    # Create a new Comment instance
+    new_comment = Comment(
+        comment_id=str(uuid4()),
+        user_email=user_email,
+        post_id=comment.post_id,
+        text=comment.text,
+        created_at=datetime.utcnow()
+    )
+
+    db.add(new_comment)
+    await db.commit()
+    await invalidate(db, comments_key(new_comment.post_id), ALL_COMMENTS)
+
+    response = to_comment_response(new_comment)
+    await publish(comment_event("created", new_comment.post_id, new_comment.comment_id, response))
+    return response
+
+# Route to get comments for a specific post, oldest first
+@router.get("/comments", response_model=List[CommentResponse])
+async def get_comments_for_post(
+    request: Request,
+    post_id: UUID,  # Parsed, so every spelling of the id maps to the same cache key
+    limit: Optional[int] = Query(None, ge=1, le=MAX_COMMENTS_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Get the comments (or one page of them) for the given post_id
+    async def build_comments():
+        post_comments = await query_comments_for_post(db, post_id, limit, offset)
+        return [to_comment_response(comment) for comment in post_comments]
+
+    # Served from the response cache (or as a 304) until a comment on this post changes
+    return await cached_json_response(request, db, [comments_key(post_id)], build_comments)
+
+# Route to get the latest comments of many posts at once (one query instead of one request per post)
+@router.get("/comments/batch", response_model=List[PostComments])
+async def get_comments_for_posts_batch(
+    request: Request,
+    post_ids: List[UUID] = Query(...),
+    limit: int = Query(DEFAULT_BATCH_COMMENTS, ge=1, le=MAX_COMMENTS_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if len(post_ids) > MAX_BATCH_POSTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_BATCH_POSTS} post_ids per request")
+
+    # One page of comments per post, newest first, in the order the posts were asked for
+    async def build_batch():
+        grouped = await get_comments_for_posts(db, post_ids, limit, offset)
+        results = []
+        for post_id in post_ids:
+            comment_count, comments = grouped.get(post_id, (0, []))
+            results.append(PostComments(
+                post_id=post_id,
+                comment_count=comment_count,
+                comments=[to_comment_response(comment) for comment in comments]
+            ))
+        return results
+
+    # Served from the response cache (or as a 304) until a comment on one of these posts changes
+    return await cached_json_response(request, db, [comments_key(post_id) for post_id in post_ids], build_batch)
+
+# Route to edit a comment
+class CommentUpdate(BaseModel):
+    comment_id: str
+    text: str
+
+@router.put("/comments", response_model=CommentResponse)
+async def edit_comment(comment_update: CommentUpdate, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The authenticated user
+    user_email = user.email
+
+    # Find the comment by ID
+    comment = await db.scalar(select(Comment).where(Comment.comment_id == comment_update.comment_id))
+    if not comment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
+
+    # Ensure that the user can only edit their own comment
+    if comment.user_email != user_email:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only edit your own comment")
+
+    # Update the comment fields
+    comment.text = comment_update.text
+    await db.commit()
+    await invalidate(db, comments_key(comment.post_id), ALL_COMMENTS)
+
+    response = to_comment_response(comment)
+    await publish(comment_event("updated", comment.post_id, comment.comment_id, response))
+    return response
+
+# Route to delete a comment
+@router.delete("/comments/{comment_id}", status_code=status.HTTP_200_OK)
+async def delete_comment(comment_id: str, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The authenticated user
+    user_email = user.email
+
+    # Find the comment by ID
+    comment = await db.scalar(select(Comment).where(Comment.comment_id == comment_id))
+    if not comment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
+
+    # Ensure the authenticated user is the owner of the comment
+    if comment.user_email != user_email:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not allowed to delete this comment")
+
+    # Delete the comment from the database
+    await db.delete(comment)
+    await db.commit()
+    await invalidate(db, comments_key(comment.post_id), ALL_COMMENTS)
+    await publish(comment_event("deleted", comment.post_id, comment.comment_id))
+
+    return {"detail": "Comment deleted successfully"}
@@ -0,0 +1,64 @@
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+
+from database import session_scope
+from auth import get_current_user
+from events import hub, is_valid_topic, Subscription, EVENTS_MAX_TOPICS
+
+router = APIRouter()
+
+# Forward queued events to the client until it goes away
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        message = await subscription.queue.get()
+        await websocket.send_text(message)
+
+# Push channel for post and comment changes (protected by JWT, passed as ?token= since browsers
+# cannot set headers on WebSockets). Clients send
+#   {"action": "subscribe", "topics": ["posts", "post:<post_id>", ...]}
+#   {"action": "unsubscribe", "topics": [...]}
+# and receive the events of their topics, or {"type": "resync"} when they fell behind.
+@router.websocket("/ws")
+async def events_socket(websocket: WebSocket, token: str = Query(...)):
+    # Authenticate before accepting the connection
+    try:
+        async with session_scope() as db:
+            await get_current_user(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = hub.subscribe()
+    sender = asyncio.create_task(send_events(websocket, subscription))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action = message["action"]
+                topics = [str(topic).lower() for topic in message["topics"]]
+            except (ValueError, KeyError, TypeError):
+                subscription.offer(json.dumps({"type": "error", "detail": "Expected {\"action\": ..., \"topics\": [...]}"}))
+                continue
+
+            if action == "subscribe":
+                topics = [topic for topic in topics if is_valid_topic(topic)]
+                if len(subscription.topics | set(topics)) > EVENTS_MAX_TOPICS:
+                    subscription.offer(json.dumps({"type": "error", "detail": f"At most {EVENTS_MAX_TOPICS} topics per connection"}))
+                    continue
+                hub.add_topics(subscription, topics)
+            elif action == "unsubscribe":
+                hub.remove_topics(subscription, topics)
+            else:
+                subscription.offer(json.dumps({"type": "error", "detail": f"Unknown action {action}"}))
+                continue
+
+            # Acknowledge (like errors, through the queue so only the sender task writes to the socket)
+            subscription.offer(json.dumps({"type": f"{action}d", "topics": topics}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
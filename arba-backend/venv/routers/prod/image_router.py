@@ -0,0 +1,45 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Query, status
+from fastapi.responses import FileResponse, Response
+
+from image_store import is_valid_digest, image_path, guess_media_type
+from image_variants import resolve_variant
+from response_cache import etag_matches
+
+router = APIRouter()
+
+# Stored images never change (their URL is their content hash), so clients may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Used while a requested variant is still being generated, so clients come back for it
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Serve an image from the content-addressed store, or its smallest variant at least ?w= pixels wide.
+# Public on purpose: <img> tags cannot send a bearer token, and digests are not guessable.
+@router.get('/images/{digest}')
+def get_image(digest: str, w: Optional[int] = Query(None, ge=1), if_none_match: Optional[str] = Header(None)):
+    if not is_valid_digest(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    path = image_path(digest)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    etag = f'"{digest}"'
+    cache_control = IMMUTABLE_CACHE_CONTROL
+    if w:
+        path, variant_width, final = resolve_variant(digest, w)
+        if variant_width:
+            etag = f'"{digest}-w{variant_width}"'
+        if not final:
+            cache_control = REVALIDATE_CACHE_CONTROL
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    # The client already has this exact file
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # FileResponse answers Range requests (206) and hands the file to the server via the
+    # ASGI pathsend extension where supported, so the bytes never pass through Python
+    return FileResponse(path, media_type=guess_media_type(path), headers=headers)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics import render_metrics
+from events import hub
+from response_cache import response_cache
+
+router = APIRouter()
+
+# Request metrics in the Prometheus text format (scraped, so not behind JWT; keep it off the public network)
+@router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    gauges = [
+        ("events_subscribers", "Connected push channel clients.", hub.subscriber_count),
+        ("response_cache_bytes", "Size of the cached response bodies.", response_cache.size),
+    ]
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
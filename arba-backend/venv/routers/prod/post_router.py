@@ -0,0 +1,210 @@
+import json
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status, File, Form, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import uuid4
+from typing import List, Optional
+
+from models import Post
+from schemas import PostCreate, PostResponse, PostPage
+from database import get_db, session_scope
+from crud import feed_query, get_posts_page, decode_cursor, encode_cursor, get_comments_for_posts
+from image_store import save_image_stream, image_url, ImageTooLargeError, MAX_UPLOAD_BYTES
+from image_variants import schedule_variants
+from routers.prod.comment_router import to_comment_response
+from auth import Principal, get_current_user
+from response_cache import cached_json_response, invalidate, FEED, ALL_COMMENTS, comments_key
+from events import publish, post_event
+from metrics import timed_serialization
+
+router = APIRouter()
+
+# Feed page size limits
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rows fetched per query when streaming the feed
+STREAM_BATCH_SIZE = 10
+
+# Most comments that can be embedded per post with ?comments=
+MAX_EMBEDDED_COMMENTS = 20
+
+# Build the API representation of a post, pointing at the image variant of the given width if any.
+# previews is the result of get_comments_for_posts when comment previews were asked for.
+def to_post_response(post: Post, image_width: Optional[int] = None, previews=None) -> PostResponse:
+    response = PostResponse(post_id=post.post_id, user_email=post.user_email, image_url=image_url(post.image_digest, image_width), caption=post.caption, created_at=post.created_at)
+    if previews is not None:
+        comment_count, comments = previews.get(post.post_id, (0, []))
+        response.comment_count = comment_count
+        response.comments = [to_comment_response(comment) for comment in comments]
+    return response
+
+# Latest comments of every post on a page in one query (None when not asked for)
+async def load_comment_previews(db: AsyncSession, posts, comments: int):
+    if not comments or not posts:
+        return None
+    return await get_comments_for_posts(db, [post.post_id for post in posts], comments)
+
+# Stream an uploaded image into the image store in chunks and return its digest
+async def store_upload(image: UploadFile) -> str:
+    try:
+        return await run_in_threadpool(save_image_stream, image.file, MAX_UPLOAD_BYTES)
+    except ImageTooLargeError:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image is larger than {MAX_UPLOAD_BYTES} bytes")
+
+# Write a feed page out as JSON while the rows are still being fetched.
+# Produces the same document as the buffered PostPage response.
+async def stream_posts_page(limit: int, after, image_width: Optional[int], comments: int):
+    # The request-scoped session may be closed before the body is sent, so use our own
+    async with session_scope() as db:
+        yield '{"posts":['
+        last_post = None
+        has_more = False
+        count = 0
+        while count < limit:
+            # Fetch the next batch with its own keyset query (one extra row past the page end)
+            batch_size = min(STREAM_BATCH_SIZE, limit - count)
+            batch = (await db.scalars(feed_query(after).limit(batch_size + 1))).all()
+            has_more = len(batch) > batch_size
+            batch = batch[:batch_size]
+            if not batch:
+                break
+
+            # Comment previews are fetched per batch, still one query for many posts
+            previews = await load_comment_previews(db, batch, comments)
+            for post in batch:
+                if count:
+                    yield ','
+                with timed_serialization():
+                    chunk = json.dumps(jsonable_encoder(to_post_response(post, image_width, previews)))
+                yield chunk
+                last_post = post
+                count += 1
+
+            if not has_more:
+                break
+            after = (last_post.created_at, last_post.post_id)
+
+        next_cursor = encode_cursor(last_post) if has_more else None
+        yield '],"next_cursor":' + json.dumps(next_cursor) + '}'
+
+# Create a new post (protected by JWT)
+@router.post('/posts', response_model=PostResponse, status_code=status.HTTP_201_CREATED)
+async def create_post(caption: str = Form(...), image: UploadFile = File(...), user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The authenticated (and existing) user
+    email = user.email
+
+    # Stream the image into the image store (never held in memory as a whole)
+    image_digest = await store_upload(image)
+
+    # Create new post and save to the database
+    post_id = str(uuid4())  # Generate a unique post ID
+    new_post = Post(post_id=post_id, user_email=email, image_digest=image_digest, caption=caption)
+    db.add(new_post)
+    await db.commit()
+
+    # Resized variants are generated in the background
+    schedule_variants(image_digest)
+    await invalidate(db, FEED)
+
+    response = to_post_response(new_post)
+    await publish(post_event("created", post_id, response))
+    return response
+
+# Get a page of posts, newest first (protected by JWT)
+@router.get('/posts', response_model=PostPage)
+async def get_all_posts(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    image_width: Optional[int] = Query(None, ge=1),  # Link each image at (at least) this width
+    comments: int = Query(0, ge=0, le=MAX_EMBEDDED_COMMENTS),  # Embed comment counts and the latest N comments
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # Resolve where this page starts (next_cursor of the previous page)
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Streamed mode: write posts out as they are fetched instead of building the page in memory
+    if stream:
+        return StreamingResponse(stream_posts_page(limit, after, image_width, comments), media_type="application/json")
+
+    # Fetch one page of posts from the database, and their latest comments if asked for
+    async def build_page():
+        posts, next_cursor = await get_posts_page(db, limit, after)
+        previews = await load_comment_previews(db, posts, comments)
+        return PostPage(posts=[to_post_response(post, image_width, previews) for post in posts], next_cursor=next_cursor)
+
+    # Served from the response cache (or as a 304) until a post, or an embedded comment, changes
+    return await cached_json_response(request, db, [FEED, ALL_COMMENTS] if comments else [FEED], build_page)
+
+# Edit a post (only the owner can edit)
+@router.put('/posts/{post_id}', response_model=PostResponse)
+async def edit_post(
+    post_id: str,
+    caption: str = Form(None),
+    image: UploadFile = File(None),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    # The authenticated user
+    email = user.email
+
+    # Find the post by ID
+    post = await db.scalar(select(Post).where(Post.post_id == post_id))
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    # Ensure the authenticated user is the owner of the post
+    if post.user_email != email:
+        raise HTTPException(status_code=403, detail="You are not allowed to edit this post")
+
+    # Update the post's details if provided
+    if caption:
+        post.caption = caption
+    if image:
+        post.image_digest = await store_upload(image)  # Stream the new image into the image store
+
+    await db.commit()
+
+    if image:
+        schedule_variants(post.image_digest)
+    await invalidate(db, FEED)
+
+    response = to_post_response(post)
+    await publish(post_event("updated", post.post_id, response))
+    return response
+
+# Delete a post (only the owner can delete)
+@router.delete('/posts/{post_id}', status_code=status.HTTP_200_OK)  # Use 200 OK instead of 204
+async def delete_post(post_id: str, user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The authenticated user
+    email = user.email
+
+    # Find the post by ID
+    post = await db.scalar(select(Post).where(Post.post_id == post_id))
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    # Ensure the authenticated user is the owner of the post
+    if post.user_email != email:
+        raise HTTPException(status_code=403, detail="You are not allowed to delete this post")
+
+    # Delete the post
+    await db.delete(post)
+    await db.commit()
+
+    # Its comments went with it
+    await invalidate(db, FEED, ALL_COMMENTS, comments_key(post.post_id))
+    await publish(post_event("deleted", post.post_id))
+
+    return {"detail": "Post deleted successfully"}
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+
+from schemas import SearchHit, SearchPage
+from database import get_db
+from crud import search_posts_and_comments, snippet_html
+from auth import Principal, get_current_user
+from response_cache import cached_json_response, FEED, ALL_COMMENTS
+
+router = APIRouter()
+
+# Search page size and depth limits (ranking cost grows with the offset)
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_OFFSET = 1000
+MAX_QUERY_LENGTH = 200
+
+# Build the API representation of a search result row
+def to_search_hit(row) -> SearchHit:
+    return SearchHit(
+        type=row.kind,
+        post_id=row.post_id,
+        comment_id=row.hit_id if row.kind == "comment" else None,
+        user_email=row.user_email,
+        created_at=row.created_at,
+        snippet=snippet_html(row.snippet),
+        rank=row.rank,
+    )
+
+# Full-text search over post captions and comments, best match first (protected by JWT).
+# q takes web search syntax: words, "quoted phrases", OR, -excluded.
+@router.get('/search', response_model=SearchPage)
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_LENGTH),
+    kind: Literal["all", "posts", "comments"] = Query("all", alias="type"),
+    author: Optional[str] = None,  # Only posts/comments by this user_email
+    limit: int = Query(DEFAULT_SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    async def build_results():
+        rows, next_offset = await search_posts_and_comments(db, q, kind, author, limit, offset)
+        if next_offset is not None and next_offset > MAX_SEARCH_OFFSET:
+            next_offset = None
+        return SearchPage(results=[to_search_hit(row) for row in rows], next_offset=next_offset)
+
+    # Results only change when posts or comments do, so they share the response cache
+    return await cached_json_response(request, db, [FEED, ALL_COMMENTS], build_results)
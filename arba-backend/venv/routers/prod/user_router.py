@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User
+from schemas import UserCreate, UserResponse, UserLogin
+from crud import create_user
+from database import get_db
+from auth import create_access_token, hash_password, check_password
+from sqlalchemy.exc import NoResultFound
+
+router = APIRouter()
+
+# Get all users from the database
+@router.get('/users', response_model=list[UserResponse])
+async def get_users(db: AsyncSession = Depends(get_db)):
+    users = (await db.scalars(select(User))).all()
+    return users
+
+# Sign Up Endpoint - Register a new user
+@router.post('/users/signup', response_model=UserResponse)
+async def sign_up(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Check if the user already exists
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if db_user:
+        raise HTTPException(status_code=400, detail="User already exists")
+    
+    # Hash the password before storing it (on the dedicated bcrypt threads)
+    hashed_password = await hash_password(user.password)
+
+    # Create and save the new user to the database
+    new_user = User(name=user.name, email=user.email, password=hashed_password)
+    db.add(new_user)
+    await db.commit()
+
+    # Return the newly created user directly, FastAPI will handle converting it to UserResponse
+    return new_user  # This will return the user in the expected format with id, name, and email fields
+
+# Login Endpoint - Authenticate a user and return a token
+@router.post('/users/login')
+async def login(login_request: UserLogin, db: AsyncSession = Depends(get_db)):
+    # Find the user by email
+    db_user = await db.scalar(select(User).where(User.email == login_request.email))
+
+    # Check the password on the dedicated bcrypt threads
+    if not db_user or not await check_password(login_request.password, db_user.password):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    # Generate a JWT token for the authenticated user
+    token = create_access_token(db_user.email, db_user.name)
+
+    # Return the token along with user details (without returning the password)
+    return {"message": "Login successful", "token": token, "name": db_user.name, "email": db_user.email}
@@ -0,0 +1,83 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
+
+# User Pydantic Model
+class UserCreate(BaseModel):
+    name: str
+    email: str
+    password: str
+
+class UserResponse(BaseModel):
+    id: int
+    name: str
+    email: str
+
+    class Config:
+        orm_mode = True
+
+# Add this to your schemas.py
+class UserLogin(BaseModel):
+    email: str
+    password: str
+
+
+# Comment Pydantic Model
+class CommentCreate(BaseModel):
+    post_id: UUID
+    text: str
+
+class CommentResponse(BaseModel):
+    comment_id: UUID  # Use UUID instead of str
+    post_id: UUID
+    user_email: str
+    text: str
+    created_at: datetime  # Use datetime instead of str
+
+    class Config:
+        orm_mode = True
+
+# Comments of one post, as returned by GET /comments/batch
+class PostComments(BaseModel):
+    post_id: UUID
+    comment_count: int  # Total number of comments on the post
+    comments: List[CommentResponse]  # Newest first
+
+# Post Pydantic Model
+class PostCreate(BaseModel):
+    caption: str
+    image: Optional[bytes] = None  # Image is optional and handled as binary data (bytes)
+    user_email: str
+
+class PostResponse(BaseModel):
+    post_id: UUID  # Use UUID instead of str
+    caption: str
+    image_url: Optional[str] = None  # Served by GET /images/{digest}
+    user_email: str
+    created_at: datetime
+    comment_count: Optional[int] = None  # Only set when the feed is asked for comment previews
+    comments: Optional[List[CommentResponse]] = None  # Latest comments, newest first
+
+    class Config:
+        orm_mode = True
+
+# One page of the feed; pass next_cursor back as ?cursor= to get the following page
+class PostPage(BaseModel):
+    posts: List[PostResponse]
+    next_cursor: Optional[str] = None  # None when there are no more posts
+
+# One GET /search result: a matching post caption or comment
+class SearchHit(BaseModel):
+    type: str  # "post" or "comment"
+    post_id: UUID  # The post, or the post the comment is on
+    comment_id: Optional[UUID] = None  # Only for comments
+    user_email: str
+    created_at: datetime
+    snippet: str  # Matching text as HTML: escaped, with the matched words in <b></b>
+    rank: float
+
+# One page of search results; pass next_offset back as ?offset= to get the following page
+class SearchPage(BaseModel):
+    results: List[SearchHit]
+    next_offset: Optional[int] = None  # None when there are no more results
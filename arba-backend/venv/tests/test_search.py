@@ -0,0 +1,55 @@
+# GET /search against the database in DATABASE_URL (run from arba-backend/venv: python -m pytest tests)
+import io
+import os
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import main
+from database import DATABASE_URL
+
+# Needs a reachable Postgres
+try:
+    with create_engine(DATABASE_URL).connect() as connection:
+        connection.execute(text("SELECT 1"))
+except OperationalError:
+    pytest.skip("No database at DATABASE_URL", allow_module_level=True)
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+# Sign up a fresh user and return the auth headers for it
+@pytest.fixture(scope="module")
+def headers(client):
+    email = f"search-{uuid4().hex}@example.com"
+    client.post("/users/signup", json={"name": "search", "email": email, "password": "secret"})
+    token = client.post("/users/login", json={"email": email, "password": "secret"}).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(scope="module")
+def post(client, headers):
+    image = ("a.png", io.BytesIO(uuid4().bytes), "image/png")
+    post = client.post("/posts", data={"caption": "Sunset over the mountains"}, files={"image": image}, headers=headers).json()
+    yield post
+    client.delete(f"/posts/{post['post_id']}", headers=headers)
+
+def test_search_finds_matching_post(client, headers, post):
+    response = client.get("/search", params={"q": "mountain", "type": "posts"}, headers=headers)
+    assert response.status_code == 200
+    assert post["post_id"] in [hit["post_id"] for hit in response.json()["results"]]
+
+# Only exclusions: nothing to look for, so nothing is returned (instead of ranking every row)
+@pytest.mark.parametrize("q", ["-beach", "-beach OR sunset"])
+def test_search_without_positive_terms_returns_nothing(client, headers, post, q):
+    response = client.get("/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"results": [], "next_offset": None}
@@ -0,0 +1,81 @@
+// store/feedEvents.js
+import { defineStore } from 'pinia'
+
+// One WebSocket to the backend push channel, shared by the feed and every comment card
+let socket = null
+let reconnectTimer = null
+let wasConnected = false
+const topicCounts = new Map() // Topic -> number of components interested in it
+const listeners = new Set()
+
+const send = (action, topics) => {
+  if (socket && socket.readyState === WebSocket.OPEN && topics.length) {
+    socket.send(JSON.stringify({ action, topics }))
+  }
+}
+
+const notify = (event) => {
+  listeners.forEach((listener) => listener(event))
+}
+
+export const useFeedEventsStore = defineStore('feedEvents', {
+  state: () => ({
+    connected: false,
+  }),
+  actions: {
+    connect() {
+      const token = localStorage.getItem('token')
+      if (socket || !token) return
+
+      socket = new WebSocket(`ws://127.0.0.1:8000/ws?token=${token}`)
+      socket.onopen = () => {
+        this.connected = true
+        send('subscribe', [...topicCounts.keys()])
+        // Changes made while we were disconnected were missed
+        if (wasConnected) notify({ type: 'resync' })
+        wasConnected = true
+      }
+      socket.onmessage = (message) => {
+        notify(JSON.parse(message.data))
+      }
+      socket.onclose = () => {
+        this.connected = false
+        socket = null
+        // Keep trying while someone is listening
+        if (listeners.size && !reconnectTimer) {
+          reconnectTimer = setTimeout(() => {
+            reconnectTimer = null
+            this.connect()
+          }, 2000)
+        }
+      }
+    },
+    // Receive every event; returns a function that stops it
+    listen(listener) {
+      listeners.add(listener)
+      this.connect()
+      return () => {
+        listeners.delete(listener)
+        if (!listeners.size && socket) socket.close()
+      }
+    },
+    // Topics: "posts" (all post changes) or `post:${postId}` (one post and its comments)
+    subscribe(topics) {
+      const added = topics.filter((topic) => !topicCounts.has(topic))
+      topics.forEach((topic) => topicCounts.set(topic, (topicCounts.get(topic) || 0) + 1))
+      send('subscribe', added)
+    },
+    unsubscribe(topics) {
+      const removed = []
+      topics.forEach((topic) => {
+        const count = (topicCounts.get(topic) || 0) - 1
+        if (count > 0) {
+          topicCounts.set(topic, count)
+        } else if (topicCounts.delete(topic)) {
+          removed.push(topic)
+        }
+      })
+      send('unsubscribe', removed)
+    },
+  },
+})
@@ -0,0 +1,9 @@
+// utils/images.js
+
+// Feed cards are 500px wide, so they show the 1080px image variant (sharp on high-DPI screens)
+export const IMAGE_WIDTH = 1080
+
+// Image URLs from pushed events and edit responses are the plain original; point them at the variant
+export const withImageWidth = (imageUrl, width = IMAGE_WIDTH) => {
+  return imageUrl && !imageUrl.includes('?') ? `${imageUrl}?w=${width}` : imageUrl
+}